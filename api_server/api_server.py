@@ -1,18 +1,20 @@
-from fastapi import FastAPI, UploadFile, BackgroundTasks, HTTPException, File
+from fastapi import FastAPI, UploadFile, HTTPException, File
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from pathlib import Path
+import os
+import asyncio
 import tempfile
 import shutil
 import zipfile
 import uuid
-from typing import Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Dict, Any, List, Optional, Tuple
 from datetime import datetime, timezone
 import uvicorn
 
-# Mas_core
-from mas_core.graph import create_scan_graph
-from mas_core.state import ScanState
+from api_server.tasks import run_scan
+from api_server.scan_store import asave_scan, aload_scan, adelete_scan, ascan_statuses
 
 app = FastAPI(
     title="Security Scanner MAS API",
@@ -28,7 +30,8 @@ app.add_middleware(
     allow_headers=["*"]
 )
 
-scan_results: Dict[str, Dict[str, Any]] = {}
+COPY_CHUNK_SIZE = 64 * 1024
+EXTRACT_WORKERS = min(8, os.cpu_count() or 1)
 
 #=============== Models ================
 class ScanRequest(BaseModel):
@@ -49,55 +52,55 @@ class ScanStatusResponse(BaseModel):
 
 # ========== Helper ===============
 
-def extract_codebase(zip_file: UploadFile) -> Path:
+def _member_path(extract_dir: Path, member_name: str) -> Path:
+    """Resolve a ZIP member name inside extract_dir, rejecting path traversal"""
+    name = member_name.replace("\\", "/")
+    parts = [p for p in name.split("/") if p not in ("", ".")]
+    if name.startswith("/") or ":" in name.split("/")[0] or ".." in parts:
+        raise ValueError(f"Unsafe path in ZIP archive: {member_name}")
+    return extract_dir.joinpath(*parts)
+
+def _extract_members(zip_ref: zipfile.ZipFile, members: List[Tuple[zipfile.ZipInfo, Path]]) -> None:
+    for info, dest in members:
+        with zip_ref.open(info) as src, open(dest, "wb") as dst:
+            shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+
+def _extract_sync(zip_file: BinaryIO) -> Path:
+    """
+    Extract the uploaded ZIP straight from the upload stream; members are
+    decompressed on a thread pool (zlib releases the GIL while inflating
+    and ZipFile serialises the underlying seeks/reads)
+    """
     temp_dir = Path(tempfile.mkdtemp(prefix="mas_scan_"))
-    zip_path = temp_dir / "codebase.zip"
-    with open(zip_path, "wb") as f:
-        shutil.copyfileobj(zip_file.file, f)
-    
     extract_dir = temp_dir / "project"
     extract_dir.mkdir()
-    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-        zip_ref.extractall(extract_dir)
-    
-    zip_path.unlink()
-    return extract_dir
 
-async def run_scan_task(scan_id: str, project_path: Path):
-    """Background task to run MAS scan"""
-    try: 
-        scan_results[scan_id]["status"] = "scanning"
-        scan_results[scan_id]["progress"] = 10
-
-        # initialize MAS
-        app_graph = create_scan_graph()
-        initial_state: ScanState = {
-            'project_path': str(project_path),
-            'all_files': [],
-            'total_files': 0,
-            'sast_results': {},
-            'sca_results': {},
-            'final_report': {},
-            'scan_status': []
-        }
-        scan_results[scan_id]["progress"] = 30
-
-        #Run scan
-        final_state = app_graph.invoke(initial_state)
-        
-        scan_results[scan_id]["status"] = "completed"
-        scan_results[scan_id]["progress"] = 100
-        scan_results[scan_id]["result"] = final_state['final_report']
-        scan_results[scan_id]["completed_at"] = datetime.now(timezone.utc).isoformat()
+    try:
+        zip_file.seek(0)
+        with zipfile.ZipFile(zip_file, 'r') as zip_ref:
+            members = []
+            for info in zip_ref.infolist():
+                dest = _member_path(extract_dir, info.filename)
+                if info.is_dir():
+                    dest.mkdir(parents=True, exist_ok=True)
+                    continue
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                members.append((info, dest))
+
+            num_workers = max(1, min(EXTRACT_WORKERS, len(members)))
+            with ThreadPoolExecutor(max_workers=num_workers) as executor:
+                shards = [members[i::num_workers] for i in range(num_workers)]
+                for future in [executor.submit(_extract_members, zip_ref, shard) for shard in shards]:
+                    future.result()
+    except Exception:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
 
-    except Exception as e:
-        scan_results[scan_id]["status"] = "failed"
-        scan_results[scan_id]["error"] = str(e)
-        scan_results[scan_id]["completed_at"] = datetime.now(timezone.utc).isoformat()
-    
-    finally:
-        shutil.rmtree(project_path.parent, ignore_errors=True)
+    return extract_dir
 
+async def extract_codebase(zip_file: UploadFile) -> Path:
+    """Extract off the event loop so one large upload doesn't stall other requests"""
+    return await asyncio.to_thread(_extract_sync, zip_file.file)
 
 # ==================== API Endpoints ====================
 
@@ -111,7 +114,6 @@ async def root():
 
 @app.post("/scan", response_model=ScanResponse)
 async def create_scan(
-    background_tasks: BackgroundTasks,
     codebase: UploadFile = File(..., description="Zip file containing project codebase"),
     project_name: str = "unnamed_project"
 ):
@@ -130,19 +132,21 @@ async def create_scan(
         raise HTTPException(status_code=400, detail="Only ZIP files are accepted")
 
     scan_id = str(uuid.uuid4())
+    project_path: Optional[Path] = None
     try:
-        project_path = extract_codebase(codebase)
-        scan_results[scan_id] = {
-            "scan_id": scan_id,
-            "project_name": project_name,
-            "status": "pending",
-            "progress": 0,
-            "created_at": datetime.now(timezone.utc).isoformat(),
-            "result": None,
-            "error": None
-        }
-
-        background_tasks.add_task(run_scan_task, scan_id, project_path)
+        project_path = await extract_codebase(codebase)
+        await asave_scan(
+            scan_id,
+            scan_id=scan_id,
+            project_name=project_name,
+            status="pending",
+            progress=0,
+            created_at=datetime.now(timezone.utc).isoformat(),
+            result=None,
+            error=None
+        )
+
+        run_scan.delay(scan_id, str(project_path))
         return ScanResponse(
             scan_id=scan_id,
             status="pending",
@@ -150,6 +154,9 @@ async def create_scan(
         )
     
     except Exception as e:
+        # the task never got the directory, so nothing else will remove it
+        if project_path is not None:
+            shutil.rmtree(project_path.parent, ignore_errors=True)
         raise HTTPException(status_code=500, detail=f"Failed to start scan: {str(e)}")
     
 @app.get("/scan/{scan_id}", response_model=ScanStatusResponse)
@@ -165,9 +172,9 @@ async def get_scan_status(scan_id: str):
     - **progress**: 0-100 (percentage)
     - **result**: Full scan report (only when status="completed")
     """
-    if scan_id not in scan_results:
+    scan_data = await aload_scan(scan_id)
+    if scan_data is None:
         raise HTTPException(status_code=404, detail="Scan ID not found")
-    scan_data = scan_results[scan_id]
     return ScanStatusResponse(
         scan_id=scan_id,
         status = scan_data["status"],
@@ -179,20 +186,19 @@ async def get_scan_status(scan_id: str):
 @app.delete("/scan/{scan_id}")
 async def delete_scan(scan_id: str):
     """Delete scan record"""
-    if scan_id not in scan_results:
+    if not await adelete_scan(scan_id):
         raise HTTPException(status_code=404, detail="Scan ID not found")
     
-    del scan_results[scan_id]
     return {"message": "Scan record deleted"}
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint for monitoring"""
+    statuses = await ascan_statuses()
     return {
         "status": "healthy",
-        "active_scans": len([s for s in scan_results.values()
-                              if s["status"] == "scanning"]),
-        "total_scans": len(scan_results)
+        "active_scans": len([s for s in statuses if s == "scanning"]),
+        "total_scans": len(statuses)
     }
 
 if __name__ == "__main__":
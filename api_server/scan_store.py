@@ -0,0 +1,62 @@
+import os
+from typing import Dict, Any, List, Optional
+
+import orjson
+import redis
+import redis.asyncio as aioredis
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Scan records expire a day after their last update
+SCAN_TTL_SECONDS = 86400
+
+# Sync client for the Celery worker, asyncio client for the API event loop
+redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+async_redis = aioredis.Redis.from_url(REDIS_URL, decode_responses=True)
+
+
+def scan_key(scan_id: str) -> str:
+    return f"scan:{scan_id}"
+
+def _encode(fields: Dict[str, Any]) -> Dict[str, bytes]:
+    """Hash values are JSON-encoded so None/int/dict round-trip"""
+    return {k: orjson.dumps(v) for k, v in fields.items()}
+
+def _decode(data: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    if not data:
+        return None
+    return {k: orjson.loads(v) for k, v in data.items()}
+
+
+# ========== Celery worker (sync) ===============
+
+def save_scan(scan_id: str, /, **fields: Any) -> None:
+    key = scan_key(scan_id)
+    pipe = redis_client.pipeline()
+    pipe.hset(key, mapping=_encode(fields))
+    pipe.expire(key, SCAN_TTL_SECONDS)
+    pipe.execute()
+
+
+# ========== API server (async) ===============
+
+async def asave_scan(scan_id: str, /, **fields: Any) -> None:
+    key = scan_key(scan_id)
+    async with async_redis.pipeline() as pipe:
+        pipe.hset(key, mapping=_encode(fields))
+        pipe.expire(key, SCAN_TTL_SECONDS)
+        await pipe.execute()
+
+async def aload_scan(scan_id: str) -> Optional[Dict[str, Any]]:
+    return _decode(await async_redis.hgetall(scan_key(scan_id))) # type: ignore
+
+async def adelete_scan(scan_id: str) -> bool:
+    return bool(await async_redis.delete(scan_key(scan_id)))
+
+async def ascan_statuses() -> List[str]:
+    """Status of every stored scan, used by the health endpoint"""
+    statuses = []
+    async for key in async_redis.scan_iter(match=scan_key("*")):
+        status = await async_redis.hget(key, "status") # type: ignore
+        if status is not None:
+            statuses.append(orjson.loads(status))
+    return statuses
@@ -0,0 +1,66 @@
+import shutil
+import asyncio
+from pathlib import Path
+from datetime import datetime, timezone
+
+from celery import Celery
+from celery.signals import worker_ready
+
+# Mas_core
+from mas_core.graph import create_scan_graph
+from mas_core.state import ScanState
+from tools.results import SastResults, ScaResults
+from api_server.scan_store import REDIS_URL, save_scan
+from tools.sast_tool import resolve_rules
+
+celery_app = Celery('scanner', broker=REDIS_URL, backend=REDIS_URL)
+
+
+@worker_ready.connect
+def sync_semgrep_rules(**kwargs):
+    """Warm the local Semgrep rules cache before the first scan arrives"""
+    resolve_rules('auto')
+
+
+# ========== Celery tasks ===============
+
+@celery_app.task(name="scanner.run_scan")
+def run_scan(scan_id: str, project_path_str: str):
+    """Celery task to run MAS scan on an extracted codebase"""
+    project_path = Path(project_path_str)
+    try:
+        save_scan(scan_id, status="scanning", progress=10)
+
+        # initialize MAS
+        app_graph = create_scan_graph()
+        initial_state: ScanState = {
+            'project_path': str(project_path),
+            'total_files': 0,
+            'sast_results': SastResults(),
+            'sca_results': ScaResults(),
+            'final_report': {},
+            'scan_status': []
+        }
+        save_scan(scan_id, progress=30)
+
+        #Run scan
+        final_state = asyncio.run(app_graph.ainvoke(initial_state))
+
+        save_scan(
+            scan_id,
+            status="completed",
+            progress=100,
+            result=final_state['final_report'],
+            completed_at=datetime.now(timezone.utc).isoformat()
+        )
+
+    except Exception as e:
+        save_scan(
+            scan_id,
+            status="failed",
+            error=str(e),
+            completed_at=datetime.now(timezone.utc).isoformat()
+        )
+
+    finally:
+        shutil.rmtree(project_path.parent, ignore_errors=True)
@@ -1,8 +1,11 @@
 import argparse
+import asyncio
 from mas_core.graph import create_scan_graph
+from mas_core.log_config import configure_logging
 from mas_core.state import ScanState
+from tools.results import SastResults, ScaResults
 from pathlib import Path
-import json
+import orjson
 
 def main():
     parser = argparse.ArgumentParser(
@@ -19,6 +22,7 @@ def main():
         help='Output report file'
     )
     args = parser.parse_args()
+    configure_logging()
 
     print("\n" + "="*60)
     print("   SECURITY SCANNER MAS")
@@ -29,21 +33,21 @@ def main():
     app = create_scan_graph()
     initial_state: ScanState = {
         'project_path': args.project,
-        'all_files': [],
         'total_files': 0,
-        'sast_results': {},
-        'sca_results': {},
+        'sast_results': SastResults(),
+        'sca_results': ScaResults(),
         'final_report': {},
         'scan_status': []
     }
 
     print(" Starting scan...\n")
-    final_state = app.invoke(initial_state)
+    final_state = asyncio.run(app.ainvoke(initial_state))
     output_path = Path(args.output)
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(final_state['final_report'], f, ensure_ascii=False)
+    output_path.write_bytes(
+        orjson.dumps(final_state['final_report'], option=orjson.OPT_APPEND_NEWLINE)
+    )
     
     print("\n" + "="*60)
     print(f" Scan completed!")
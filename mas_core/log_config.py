@@ -0,0 +1,34 @@
+import sys
+import queue
+import atexit
+import logging
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+_listener: Optional[QueueListener] = None
+
+
+def configure_logging(level: int = logging.INFO) -> None:
+    """
+    Route log records through a queue to a single stdout handler running
+    on a background thread, so scan workers never block on terminal I/O.
+    Safe to call more than once; processes that already configure logging
+    (Celery workers) should not call it.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(logging.Formatter(LOG_FORMAT))
+    _listener = QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+    # flush whatever is still queued on interpreter exit
+    atexit.register(_listener.stop)
+
+    root = logging.getLogger()
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(level)
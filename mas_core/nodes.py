@@ -1,99 +1,202 @@
 import os
+import queue
+import asyncio
+import logging
+import msgspec
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from .state import ScanState
-from tools.sast_tool import SemgrepScanner
-from tools.sca_tool import SnykScanner
+from tools.sast_tool import SemgrepScanner, semgrep_version
+from tools.sca_tool import SnykScanner, MANIFESTS
+from tools.results import SastResults, Vuln, sort_by_severity
 from .schemas.llm_analyzer import analyze_with_llm
-from typing import List, Dict, Any
-
-
-#========================= Node 1: COORDINATOR ===========================
-def coordinator_node(state: ScanState) -> Dict[str, Any]:
+from .scan_cache import CACHE_ERRORS, sast_cache, sast_cache_key, file_hashes
+from typing import Callable, FrozenSet, Iterable, Iterator, List, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+EXT_SET = frozenset(('.py', '.js', '.jsx', '.ts', '.tsx', '.java', '.php', '.go', '.rb'))
+IGNORE = frozenset(('node_modules', '.git', 'venv', '.venv', '__pycache__', 'build', 'dist'))
+WALK_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+try:
+    # Optional Rust walker (pip install scandir-rs), several times faster on huge trees
+    from scandir_rs import Walk as NativeWalk
+except ImportError:
+    NativeWalk = None
+# scandir-rs matches dir_exclude globs against paths relative to the root
+NATIVE_DIR_EXCLUDE = [f"**/{d}" for d in sorted(IGNORE)]
+
+#========================= File discovery ================================
+def _walk(dirpath: str, emit: Callable[[str], None],
+          exts: FrozenSet[str], names: FrozenSet[str]) -> List[str]:
     """
-    Node analyze project, finding files to scan
+    Scan a single directory, emit files matching exts or names and
+    return the subdirectories still to be walked
     """
-    print("\n" + "="*60)
-    print("COORDINATOR: Analyze project...")
-    print("\n" + "="*60)
-
-    project_path = state['project_path']
-    all_files = scan_project_files(project_path)
-    print(f" ---> Found {len(all_files)} files to scan")
-    for f in all_files[:5]: 
-        print(f"  - {f}")
-    if len(all_files) > 5:
-        print(f"  ... and {len(all_files) - 5} other files")
-    
-    return {
-        'all_files': all_files,
-        'total_files': len(all_files),
-        'scan_status': ['ready_to_scan']
-    }
-
-def scan_project_files(project_path: str) -> List[str]:
-    file_extensions = {'.py', '.js', '.jsx', '.ts', '.tsx', '.java', '.php', '.go', '.rb'}
-    ignore_dirs = {'node_modules', '.git', 'venv', '.venv', '__pycache__', 'build', 'dist'}
-    
-    files = []
-    for root, dirs, filenames in os.walk(project_path):
-        dirs[:] = [d for d in dirs if d not in ignore_dirs]
-
-        for filename in filenames:
-            if any(filename.endswith(ext) for ext in file_extensions):
-                file_path = os.path.join(root, filename)
-                files.append(file_path)
-    return files
-
-#======================== Node 2: SAST Worker ==============================
-def sast_worker_node(state: ScanState) -> Dict[str, Any]:
+    subdirs = []
+    try:
+        with os.scandir(dirpath) as it:
+            for entry in it:
+                # DirEntry caches the d_type from getdents, no extra stat call
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in IGNORE:
+                        subdirs.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    # plain rfind slice, skips splitext's drive/sep handling
+                    name = entry.name
+                    dot = name.rfind('.')
+                    if (dot >= 0 and name[dot:] in exts) or name in names:
+                        emit(entry.path)
+    except OSError:
+        pass
+    return subdirs
+
+def iter_project_files(project_path: str, exts: FrozenSet[str] = EXT_SET,
+                       names: FrozenSet[str] = frozenset()) -> Iterator[str]:
     """
-    Node scan code with Semgrep
-    Parallel with SCA worker
+    Yield files matching exts (source code by default) or exact names
+    while the walk is still running, so consumers (hashing, scanners)
+    overlap with directory I/O
     """
+    if NativeWalk is not None:
+        yield from _iter_native(project_path, exts, names)
+        return
+
+    found: "queue.SimpleQueue[str]" = queue.SimpleQueue()
+    with ThreadPoolExecutor(max_workers=WALK_WORKERS) as executor:
+        pending = {executor.submit(_walk, project_path, found.put, exts, names)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                for subdir in future.result():
+                    pending.add(executor.submit(_walk, subdir, found.put, exts, names))
+            while not found.empty():
+                yield found.get()
+
+def _iter_native(project_path: str, exts: FrozenSet[str], names: FrozenSet[str]) -> Iterator[str]:
+    """iter_project_files backed by scandir-rs, which walks and filters dirs in native threads"""
+    walker = NativeWalk(
+        project_path, skip_hidden=False, follow_links=False, dir_exclude=NATIVE_DIR_EXCLUDE
+    )
+    for root, _, filenames in walker:
+        base = os.path.join(project_path, root) if root else project_path
+        for name in filenames:
+            dot = name.rfind('.')
+            if (dot >= 0 and name[dot:] in exts) or name in names:
+                yield os.path.join(base, name)
+
+#======================== Node 1: SAST Worker ==============================
+async def sast_worker_node(state: ScanState) -> Dict[str, Any]:
+    """
+    Node discovers files to scan, then scans them with Semgrep
+    Parallel with SCA worker (SCA doesn't need the file list, so
+    it no longer waits behind the walk). Blocking work (rules sync,
+    walk, hashing, cache I/O) runs in threads so the event loop stays
+    free to drive the Snyk subprocesses meanwhile
+    """
+    logger.info("SAST worker: discovering and scanning code")
 
-    print("\n" + "="*60)
-    print("SAST WORKER: Scanning code...")
-    print("="*60)
-
-    scanner = SemgrepScanner(rules_config='auto')
-    results = scanner.scan_files(state['all_files'])
+    # resolving 'auto' may download the rules bundle
+    scanner = await asyncio.to_thread(SemgrepScanner, rules_config='auto')
+    results = await _cached_sast_scan(scanner, iter_project_files(state['project_path']))
+    logger.info("SAST worker: scanned %d files", results.total_files)
     
     return {
+        'total_files': results.total_files,
         'sast_results': results,
         'scan_status': ['sast_completed']
     } 
 
-# ======================= Node 3: SCA worker ================================
-def sca_worker_node(state: ScanState) -> Dict[str, Any]:    
+async def _cached_sast_scan(scanner: SemgrepScanner, files: Iterable[str]) -> SastResults:
+    """
+    Serve unchanged files from the per-file cache, send only misses to Semgrep
+    """
+    version = await asyncio.to_thread(semgrep_version)
+    if not version:
+        return await scanner.scan_files(await asyncio.to_thread(sorted, files))
+
+    # hashing consumes paths as the walk yields them
+    digests = await asyncio.to_thread(file_hashes, files)
+    all_files = sorted(digests)
+    keys = {
+        file_path: sast_cache_key(digest, version, scanner.rules_fingerprint)
+        for file_path, digest in digests.items() if digest is not None
+    }
+    try:
+        hits = await asyncio.to_thread(sast_cache.get_many, keys.values())
+    except CACHE_ERRORS as e:
+        logger.warning("SAST cache unavailable, scanning every file: %s", e)
+        hits = {}
+
+    vulnerabilities: List[Vuln] = []
+    misses = []
+    for file_path in all_files:
+        cached = hits.get(keys.get(file_path, ''))
+        if cached is None:
+            misses.append(file_path)
+            continue
+        # cached findings carry the path from the scan that produced them
+        vulnerabilities.extend(msgspec.structs.replace(vuln, path=file_path) for vuln in cached)
+    logger.info("%d files served from SAST cache", len(all_files) - len(misses))
+
+    results = await scanner.scan_files(misses)
+    new_vulns = results.vulnerabilities
+    if results.error is None:
+        by_path: Dict[str, List[Vuln]] = {}
+        for vuln in new_vulns:
+            by_path.setdefault(os.path.normpath(vuln.path or ''), []).append(vuln)
+        # files Semgrep errored on (timeouts, parse failures) are rescanned next time
+        failed = {os.path.normpath(p) for p in results.error_paths}
+        try:
+            await asyncio.to_thread(sast_cache.put_many, {
+                keys[f]: by_path.get(os.path.normpath(f), ())
+                for f in misses if f in keys and os.path.normpath(f) not in failed
+            })
+        except CACHE_ERRORS as e:
+            logger.warning("Could not store SAST results in cache: %s", e)
+    vulnerabilities.extend(new_vulns)
+    sort_by_severity(vulnerabilities)
+
+    return msgspec.structs.replace(
+        results,
+        total_files=len(all_files),
+        vulnerabilities=vulnerabilities,
+        total_issues=len(vulnerabilities)
+    )
+
+# ======================= Node 2: SCA worker ================================
+async def sca_worker_node(state: ScanState) -> Dict[str, Any]:    
     """
-    Node scan dependencies with Snyk
+    Node scan dependencies with Snyk, one run per manifest file
     Parallel with SAST worker
     """
-    print("\n" + "="*60)
-    print("SCA WORKER: Scanning code...")
-    print("="*60)
+    logger.info("SCA worker: scanning dependencies")
 
+    # manifest-only walk, Snyk no longer globs the whole extracted tree
+    manifests = await asyncio.to_thread(
+        sorted, iter_project_files(state['project_path'], exts=frozenset(), names=MANIFESTS)
+    )
     scanner = SnykScanner()
-    results = scanner.scan_dependencies(state['project_path'])
+    results = await scanner.scan_dependencies(state['project_path'], manifests)
     return {
         'sca_results': results,
         'scan_status': ['sca_completed']
     }
 
-# ====================== Node 4: AGGREGATOR =================================
+# ====================== Node 3: AGGREGATOR =================================
 def aggregator_node(state: ScanState) -> Dict[str, Any]:
     """ 
     Node aggregates results from SAST and SCA
     """
-    print("\n" + "="*60)
-    print("AGGREGATOR: AI Security Analysis...")
-    print("="*60)
+    logger.info("Aggregator: AI security analysis")
 
-    sast_results = state.get('sast_results', {})
-    sca_results = state.get('sca_results', {})
+    sast_results = state['sast_results']
+    sca_results = state['sca_results']
 
-    total_sast_issues = sast_results.get('total_issues', 0)
-    total_sca_issues = sca_results.get('total_issues', 0)
+    total_sast_issues = sast_results.total_issues
+    total_sca_issues = sca_results.total_issues
 
+    # returns a local result without an LLM call when there are no findings
     llm_analysis = analyze_with_llm(
         sast_results=sast_results,
         sca_results=sca_results,
@@ -0,0 +1,150 @@
+import os
+import time
+import hashlib
+import sqlite3
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import msgspec
+
+from tools.results import Vuln
+
+CACHE_DIR = Path(os.getenv("SECURITY_MAS_CACHE_DIR", Path.home() / ".cache" / "security-mas"))
+CACHE_DB = CACHE_DIR / "scan_cache.sqlite3"
+
+# Bump to invalidate every cached entry (e.g. when result shape changes)
+CACHE_VERSION = "v4"
+
+# Entries older than this are pruned; keys change with file content,
+# Semgrep version and rules, so stale rows would otherwise pile up forever
+CACHE_MAX_AGE_SECONDS = 14 * 86400
+PRUNE_INTERVAL_SECONDS = 3600
+
+# What a cache read/write can raise: unwritable or missing cache dir, a
+# locked or corrupt database, a row that no longer decodes. Callers treat
+# these as a miss since the cache is only an optimisation
+CACHE_ERRORS = (sqlite3.Error, OSError, msgspec.DecodeError)
+
+HASH_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+_SQLITE_MAX_PARAMS = 500
+
+
+def file_hash(path: str) -> str:
+    """
+    sha256 of file content; file_digest reads into a C buffer and
+    releases the GIL, so no Python bytes copy is made per file
+    """
+    with open(path, 'rb') as f:
+        return hashlib.file_digest(f, 'sha256').hexdigest()
+
+
+def file_hashes(paths: Iterable[str]) -> Dict[str, Optional[str]]:
+    """
+    Hash files in parallel as paths arrive from the iterable,
+    unreadable files map to None
+    """
+    def _hash(path: str) -> Optional[str]:
+        try:
+            return file_hash(path)
+        except OSError:
+            return None
+
+    with ThreadPoolExecutor(max_workers=HASH_WORKERS) as executor:
+        futures = {path: executor.submit(_hash, path) for path in paths}
+        return {path: future.result() for path, future in futures.items()}
+
+
+class ScanCache:
+    """
+    Key/value cache stored in one SQLite table, values are JSON-encoded
+    with msgspec and decoded back into value_type. Rows older than
+    max_age are deleted, at most once per PRUNE_INTERVAL_SECONDS on write
+    """
+    def __init__(self, table: str, value_type: Any = Any, db_path: Path = CACHE_DB,
+                 max_age: int = CACHE_MAX_AGE_SECONDS):
+        self.table = table
+        self.db_path = db_path
+        self.max_age = max_age
+        self._decoder = msgspec.json.Decoder(value_type)
+        self._ready = False
+        self._last_prune = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._ready:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        if not self._ready:
+            with conn:
+                columns = {row[1] for row in conn.execute(f"PRAGMA table_info({self.table})")}
+                if columns and 'created_at' not in columns:
+                    # table from before pruning existed, it only holds cache rows
+                    conn.execute(f"DROP TABLE {self.table}")
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {self.table} "
+                    "(key TEXT PRIMARY KEY, blob BLOB NOT NULL, created_at INTEGER NOT NULL)"
+                )
+                conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS {self.table}_created_at "
+                    f"ON {self.table} (created_at)"
+                )
+            self._ready = True
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                f"SELECT blob FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        return self._decoder.decode(row[0]) if row else None
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        keys = list(keys)
+        found: Dict[str, Any] = {}
+        with closing(self._connect()) as conn:
+            for i in range(0, len(keys), _SQLITE_MAX_PARAMS):
+                batch = keys[i:i + _SQLITE_MAX_PARAMS]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT key, blob FROM {self.table} WHERE key IN ({placeholders})",
+                    batch
+                )
+                found.update((key, self._decoder.decode(blob)) for key, blob in rows)
+        return found
+
+    def put(self, key: str, value: Any) -> None:
+        self.put_many({key: value})
+
+    def put_many(self, items: Dict[str, Any]) -> None:
+        if not items:
+            return
+        now = int(time.time())
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, blob, created_at) VALUES (?, ?, ?)",
+                [(key, msgspec.json.encode(value), now) for key, value in items.items()]
+            )
+            if now - self._last_prune >= PRUNE_INTERVAL_SECONDS:
+                self._last_prune = now
+                conn.execute(
+                    f"DELETE FROM {self.table} WHERE created_at < ?", (now - self.max_age,)
+                )
+
+    def prune(self) -> int:
+        """Delete rows older than max_age, returns how many were removed"""
+        with closing(self._connect()) as conn, conn:
+            return conn.execute(
+                f"DELETE FROM {self.table} WHERE created_at < ?",
+                (int(time.time()) - self.max_age,)
+            ).rowcount
+
+
+# Per-file Semgrep findings, keyed by content hash + semgrep version + rules
+sast_cache = ScanCache("sast_cache", List[Vuln])
+
+def sast_cache_key(content_hash: str, semgrep_version: str, rules_config: str) -> str:
+    return f"{CACHE_VERSION}:{semgrep_version}:{rules_config}:{content_hash}"
+
+# LLMAnalysisResult dumps, keyed by a fingerprint of the analyzer inputs
+llm_cache = ScanCache("llm_cache")
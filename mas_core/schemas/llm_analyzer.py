@@ -1,40 +1,254 @@
 import os
-from typing import Dict, List
+import hashlib
+import logging
+import mmap
+import functools
+import itertools
+from typing import Dict, List, Tuple
+import msgspec
 from pydantic import SecretStr
 from langchain_openai import ChatOpenAI
-from .security import LLMAnalysisResult
+from .security import FixSuggestion, LLMAnalysisResult, SecurityIssue
+from ..scan_cache import CACHE_ERRORS, llm_cache
+from tools.results import SastResults, ScaResults, ScaVuln, Vuln
+from tools.sca_tool import NO_MANIFESTS_ERROR
 from dotenv import load_dotenv
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-def analyze_with_llm(sast_results: Dict, sca_results: Dict, total_files: int,  project_path: str): 
-    
-    llm = ChatOpenAI( 
-        model = "gpt-5.2",
+MODEL_NAME = "gpt-5.2"
+# Bump whenever the prompt or output schema changes to invalidate cached analyses
+PROMPT_VERSION = "v9"
+# Findings per tool sent to the LLM (scanner results are sorted worst first)
+MAX_FINDINGS = 15
+# Findings text above this many tokens is split into batches of BATCH_SIZE
+FINDINGS_TOKEN_BUDGET = 8000
+BATCH_SIZE = 25
+RISK_ORDER = ["Critical", "High", "Medium", "Low"]
+# Separates finding entries in the prompt
+_SEP = "\n\n"
+# Lines of code shown before/after each SAST finding
+CONTEXT_LINES = 3
+# Hard cap on every code block embedded in the prompt
+MAX_BLOCK_LINES = 12
+MAX_BLOCK_CHARS = 400
+
+# Output field guidance, kept here rather than in the schema's Field
+# descriptions so the tool schema sent with every call stays small
+OUTPUT_GUIDANCE = """OUTPUT FIELDS:
+- issues: one entry per finding above, in finding number order (merge only true duplicates); tool is the scanner that found it (Semgrep, Snyk)
+- risk_level: Critical | High | Medium | Low, based on exploitability and impact
+- location: file_path, start_line (0 if unknown), optional end_line; null for SCA dependency issues
+- fix.description: what to change and why, including exact commands (for dependencies, the upgrade command given with the finding)
+- fix.patch: unified diff for code fixes; null for dependency issues or when no concrete patch can be generated
+- overall_risk: the highest severity found
+- remediation_priority: 3-5 concrete actions, most urgent first, e.g.
+  "Fix SQL injection in auth.py line 45 by using parameterized queries"
+  "Upgrade <package> from <version> to <fixed version> (<its upgrade command>)"
+  "Replace pickle deserialization with JSON in data_handler.py"
+"""
+
+# Upgrade command per Snyk package manager; ecosystems without one only get
+# the fixed version
+UPGRADE_COMMANDS = {
+    'pip': 'pip install {package}=={version}',
+    'pipenv': 'pipenv install {package}=={version}',
+    'poetry': 'poetry add {package}@{version}',
+    'npm': 'npm install {package}@{version}',
+    'yarn': 'yarn add {package}@{version}',
+    'pnpm': 'pnpm add {package}@{version}',
+    'maven': 'set {package} to {version} in pom.xml',
+    'gradle': 'set {package} to {version} in build.gradle',
+    'gomodules': 'go get {package}@v{version}',
+    'rubygems': 'bundle update {package}',
+    'composer': 'composer require {package}:{version}',
+}
+
+@functools.lru_cache(maxsize=1)
+def _get_llm():
+    """
+    Structured-output runnable built once per process, reusing its schema
+    binding and the HTTP connection pool across scans
+    """
+    return ChatOpenAI(
+        model = MODEL_NAME,
         temperature=0.1,
         api_key= SecretStr(OPENAI_API_KEY) if OPENAI_API_KEY else None
-
     ).with_structured_output(LLMAnalysisResult)
-    sast_vulns = sast_results.get('vulnerabilities', [])[:15] 
-    sca_vulns = sca_results.get('vulnerabilities', [])[:15]
 
-    sast_summary = format_sast_findings_with_code(sast_vulns, project_path)
-    sca_summary = format_sca_findings(sca_vulns)
+def analysis_cache_key(sast_entries: List[str], sca_entries: List[str], total_files: int) -> str:
+    """
+    Hash of the rendered prompt entries, code snippets included: findings
+    alone don't identify the code (Semgrep may report `lines` as "requires
+    login"). 128 bits is plenty for a cache key
+    """
+    payload = [sast_entries, sca_entries, total_files, MODEL_NAME, PROMPT_VERSION]
+    return hashlib.blake2b(
+        msgspec.json.encode(payload, order='deterministic'), digest_size=16
+    ).hexdigest()
+
+def analyze_with_llm(sast_results: SastResults, sca_results: ScaResults, total_files: int,  project_path: str): 
+    
+    sast_vulns = sast_results.vulnerabilities[:MAX_FINDINGS]
+    sca_vulns = sca_results.vulnerabilities[:MAX_FINDINGS]
+
+    if not sast_vulns and not sca_vulns:
+        # Nothing for the LLM to triage, skip the round-trip (and the cache)
+        failures = scan_failures(sast_results, sca_results)
+        if failures:
+            logger.warning("No findings but %d scanner(s) failed, skipping LLM analysis", len(failures))
+            return failed_scan_result(failures)
+        logger.info("No findings, skipping LLM analysis")
+        return LLMAnalysisResult.model_construct(
+            issues=[],
+            overall_risk="Low",
+            remediation_priority=[
+                "No issues found.",
+                "Keep SAST/SCA scanning enabled in CI/CD",
+                "Re-scan after dependency or code changes"
+            ]
+        )
 
-    prompt = f"""You are a senior Application Security Engineer. Your job is to provide ACTIONABLE, DETAILED security fixes.
+    # key and prompt on project-relative paths, so the same code uploaded
+    # into a fresh temp dir hits the cache and issues don't point at it
+    sast_vulns = _relative_to_project(sast_vulns, project_path)
+    sast_entries = sast_finding_entries(sast_vulns, project_path)
+    sca_entries = sca_finding_entries(sca_vulns)
+    # snippets are built, release the cached file contents
+    _file_index.cache_clear()
 
-SCAN CONTEXT:
-- Total files scanned: {total_files}
-- SAST findings: {len(sast_vulns)} code vulnerabilities
-- SCA findings: {len(sca_vulns)} dependency issues
+    cache_key = analysis_cache_key(sast_entries, sca_entries, total_files)
+    try:
+        cached = llm_cache.get(cache_key)
+    except CACHE_ERRORS as e:
+        logger.warning("LLM cache unavailable: %s", e)
+        cached = None
+    if cached is not None:
+        logger.info("LLM analysis served from cache")
+        return LLMAnalysisResult.from_cached(cached)
 
-SAST FINDINGS (with code context):
-{sast_summary}
+    try:
+        batches = batch_findings(sast_entries, sca_entries)
+        analyses = [
+            _get_llm().invoke(build_prompt(total_files, s, c, i, len(batches)))
+            for i, (s, c) in enumerate(batches, 1)
+        ]
+        analysis = analyses[0] if len(analyses) == 1 else merge_analyses(analyses) # type: ignore
+        
+        logger.info(
+            "LLM analysis completed in %d batch(es): %d issues (%d with patches), "
+            "overall risk %s, %d priority actions",
+            len(batches),
+            len(analysis.issues), # type: ignore
+            sum(1 for i in analysis.issues if i.fix and i.fix.patch), # type: ignore
+            analysis.overall_risk, # type: ignore
+            len(analysis.remediation_priority) # type: ignore
+        )
+    except Exception as e:
+        logger.error("LLM analysis failed: %s", e)
+        raise
 
-SCA FINDINGS:
-{sca_summary}
+    # the analysis is already paid for, a cache failure must not lose it
+    try:
+        llm_cache.put(cache_key, analysis.model_dump(mode='json')) # type: ignore
+    except CACHE_ERRORS as e:
+        logger.warning("Could not store LLM analysis in cache: %s", e)
+    return analysis
 
-YOUR MISSION:
+
+def scan_failures(sast_results: SastResults, sca_results: ScaResults) -> List[Tuple[str, str]]:
+    """(tool, error) for each scanner that failed; a project without manifests is not a failure"""
+    failures = []
+    if sast_results.error:
+        failures.append(("Semgrep", sast_results.error))
+    if sca_results.error and sca_results.error != NO_MANIFESTS_ERROR:
+        failures.append(("Snyk", sca_results.error))
+    return failures
+
+def failed_scan_result(failures: List[Tuple[str, str]]) -> LLMAnalysisResult:
+    """
+    Local result for a scan with no findings because a scanner failed:
+    code that wasn't analysed is reported as a High issue, never as clean
+    """
+    issues = [
+        SecurityIssue.model_construct(
+            tool=tool,
+            risk_level="High",
+            message=f"{tool} scan failed, results are incomplete: {_first_line(error)}",
+            location=None,
+            fix=FixSuggestion.model_construct(
+                description=f"Fix the {tool} setup (installed, authenticated, within the timeout) and re-scan",
+                patch=None
+            )
+        )
+        for tool, error in failures
+    ]
+    return LLMAnalysisResult.model_construct(
+        issues=issues,
+        overall_risk="High",
+        remediation_priority=[
+            *(f"Fix the failed {tool} scan and re-run it" for tool, _ in failures),
+            "Do not treat this project as clean until every scanner completes",
+            "Keep SAST/SCA scanning enabled in CI/CD"
+        ][:5]
+    )
+
+def _first_line(text: str, limit: int = 200) -> str:
+    line = text.strip().split("\n", 1)[0]
+    return line if len(line) <= limit else line[:limit - 3] + "..."
+
+
+@functools.lru_cache(maxsize=1)
+def _get_encoding():
+    """tiktoken encoding if installed and loadable (it may need to download), else None"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+def _count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding is None:
+        # ~4 characters per token for English/code
+        return len(text) // 4
+    return len(encoding.encode(text))
+
+def batch_findings(sast_entries: List[str], sca_entries: List[str]) -> List[Tuple[List[str], List[str]]]:
+    """
+    One (sast, sca) batch when the findings fit FINDINGS_TOKEN_BUDGET,
+    otherwise consecutive chunks of BATCH_SIZE findings, so every call
+    shares the instruction text across as many findings as possible
+    """
+    if _count_tokens(_SEP.join(sast_entries + sca_entries)) <= FINDINGS_TOKEN_BUDGET:
+        return [(sast_entries, sca_entries)]
+    tagged = [(True, e) for e in sast_entries] + [(False, e) for e in sca_entries]
+    return [
+        ([e for is_sast, e in chunk if is_sast], [e for is_sast, e in chunk if not is_sast])
+        for chunk in (tagged[i:i + BATCH_SIZE] for i in range(0, len(tagged), BATCH_SIZE))
+    ]
+
+def merge_analyses(analyses: List[LLMAnalysisResult]) -> LLMAnalysisResult:
+    """Combine per-batch results: all issues, worst risk, interleaved top actions"""
+    priority: List[str] = []
+    for actions in itertools.zip_longest(*(a.remediation_priority for a in analyses)):
+        for action in actions:
+            if action is not None and action not in priority:
+                priority.append(action)
+    # every part was validated when its batch was parsed
+    return LLMAnalysisResult.model_construct(
+        issues=[issue for a in analyses for issue in a.issues],
+        overall_risk=min((a.overall_risk for a in analyses), key=RISK_ORDER.index),
+        remediation_priority=priority[:5]
+    )
+
+
+# Static prompt parts, built once; build_prompt only interpolates the scan data
+_PROMPT_HEADER = "You are a senior Application Security Engineer. Your job is to provide ACTIONABLE, DETAILED security fixes."
+
+_PROMPT_FOOTER = """YOUR MISSION:
 For EACH finding, you must:
 
 1. **Extract exact location**: Use file_path and line numbers FROM THE RAW DATA ABOVE
@@ -47,14 +261,15 @@ PATCH FORMAT EXAMPLE:
 +++ b/app.py
 @@ -10,7 +10,8 @@
  def get_user(user_id):
--    query = f"SELECT * FROM users WHERE id = {{user_id}}"
+-    query = f"SELECT * FROM users WHERE id = {user_id}"
 -    return db.execute(query)
 +    # Fixed: Use parameterized query to prevent SQL injection
 +    query = "SELECT * FROM users WHERE id = ?"
 +    return db.execute(query, [user_id])
 ```
 
-⚠️ CRITICAL RULES:
+""" + OUTPUT_GUIDANCE + """
+CRITICAL RULES:
 - Line numbers MUST match the data above (don't invent them!)
 - If no line number in raw data, set start_line to 0
 - Patches should be REAL, executable diffs (not pseudocode)
@@ -67,13 +282,13 @@ EXAMPLES OF GOOD FIXES:
 **SQL Injection Fix:**
 ```
 description: "Replace string formatting with parameterized queries"
-patch: "--- a/app.py\\n+++ b/app.py\\n@@ -5,2 +5,3 @@\\n-query = f\\"SELECT * FROM users WHERE id={{uid}}\\"\\n+query = \\"SELECT * FROM users WHERE id=?\\"\\n+cursor.execute(query, [uid])"
+patch: "--- a/app.py\\n+++ b/app.py\\n@@ -5,2 +5,3 @@\\n-query = f\\"SELECT * FROM users WHERE id={uid}\\"\\n+query = \\"SELECT * FROM users WHERE id=?\\"\\n+cursor.execute(query, [uid])"
 ```
 
 **XSS Fix:**
 ```
 description: "Use auto-escaping template instead of raw HTML concatenation"
-patch: "--- a/views.py\\n+++ b/views.py\\n@@ -10,2 +10,3 @@\\n-return f'<div>{{user_input}}</div>'\\n+from markupsafe import escape\\n+return f'<div>{{escape(user_input)}}</div>'"
+patch: "--- a/views.py\\n+++ b/views.py\\n@@ -10,2 +10,3 @@\\n-return f'<div>{user_input}</div>'\\n+from markupsafe import escape\\n+return f'<div>{escape(user_input)}</div>'"
 ```
 
 **Dependency Fix:**
@@ -86,123 +301,259 @@ patch: null
 NOW ANALYZE THE FINDINGS ABOVE AND RETURN STRUCTURED SecurityIssue OBJECTS WITH REAL, ACTIONABLE FIXES.
 """
 
-    try:
-        analysis = llm.invoke(prompt)
-        
-        print(f"\n✅ LLM Analysis completed:")
-        print(f"   - Unified {len(analysis.issues)} security issues") # type: ignore
-        print(f"   - Overall risk: {analysis.overall_risk}")    # type: ignore
-        print(f"   - {len(analysis.remediation_priority)} priority actions") # type: ignore
-        
-        # Show sample fixes
-        issues_with_patches = [i for i in analysis.issues if i.fix and i.fix.patch] # type: ignore
-        if issues_with_patches:
-            print(f"   - {len(issues_with_patches)} issues have code patches")
-        
-        return analysis 
-        
-    except Exception as e:
-        print(f"\nLLM Analysis failed: {e}")
-        raise
 
+def build_prompt(total_files: int, sast_entries: List[str], sca_entries: List[str],
+                 batch: int = 1, batches: int = 1) -> str:
+    """
+    batch/batches: position of this call when the findings are split (see
+    batch_findings); a partial batch leaves out a section it has no entries
+    for instead of claiming the scan found none
+    """
+    context = (
+        "SCAN CONTEXT:\n"
+        f"- Total files scanned: {total_files}\n"
+        f"- SAST findings: {len(sast_entries)} code vulnerabilities\n"
+        f"- SCA findings: {len(sca_entries)} dependency issues"
+    )
+    if batches > 1:
+        context += (
+            f"\n- Batch {batch} of {batches}: the scan's findings are split across "
+            "batches, these counts cover only the findings below"
+        )
+    sections = [_PROMPT_HEADER, context]
+    if sast_entries or batches == 1:
+        sections.append("SAST FINDINGS (with code context):\n" + (_SEP.join(sast_entries) or "No SAST issues found."))
+    if sca_entries or batches == 1:
+        sections.append("SCA FINDINGS:\n" + (_SEP.join(sca_entries) or "No SCA issues found."))
+    sections.append(_PROMPT_FOOTER)
+    return "\n\n".join(sections)
+
+
+def format_sast_findings_with_code(vulnerabilities: List[Vuln], project_path: str) -> str:
+    entries = sast_finding_entries(_relative_to_project(vulnerabilities, project_path), project_path)
+    return _SEP.join(entries) or "No SAST issues found."
+
+def sast_finding_entries(vulnerabilities: List[Vuln], project_path: str) -> List[str]:
+    """
+    One numbered prompt entry per SAST finding, with its code snippet;
+    finding paths are relative to project_path (see _relative_to_project)
+    """
+    root = os.path.abspath(project_path)
+    # index each file only as far as its deepest finding needs, one cached index per file
+    read_upto: Dict[str, int] = {}
+    for vuln in vulnerabilities:
+        if vuln.path and vuln.line:
+            read_upto[vuln.path] = max(read_upto.get(vuln.path, 0), vuln.line + CONTEXT_LINES)
+    abs_paths = {path: os.path.join(root, path) for path in read_upto}
 
-def format_sast_findings_with_code(vulnerabilities: List[Dict], project_path: str) -> str:
-    if not vulnerabilities:
-        return "No SAST issues found."
-    
     formatted = []
     for idx, vuln in enumerate(vulnerabilities, 1):
-        entry = f"\n{'='*50}\nISSUE #{idx}: {vuln.get('check_id', 'Unknown')}"
-        entry += f"\nSeverity: {vuln.get('severity', 'N/A')}"
-        entry += f"\nMessage: {vuln.get('message', 'N/A')}"
+        parts = [
+            f"ISSUE #{idx}: {vuln.check_id or 'Unknown'}",
+            f"Severity: {vuln.severity or 'N/A'}",
+            f"Message: {vuln.message or 'N/A'}"
+        ]
         
-        file_path = vuln.get('path', '')
-        line_num = vuln.get('line', vuln.get('start', {}).get('line'))
+        file_path = vuln.path or ''
+        line_num = vuln.line
         
+        # whether the snippet already shows everything in vuln.lines
+        covered = False
+
         if file_path:
-            entry += f"\nFile: {file_path}"
+            parts.append(f"File: {file_path}")
         if line_num:
-            entry += f"\nLine: {line_num}"
+            parts.append(f"Line: {line_num}")
             
             # READ ACTUAL CODE SNIPPET
             code_snippet = extract_code_snippet(
-                os.path.join(project_path, file_path) if not os.path.isabs(file_path) else file_path,
+                abs_paths[file_path],
                 line_num,
-                context_lines=3
+                context_lines=CONTEXT_LINES,
+                read_upto=read_upto[file_path]
             )
             if code_snippet:
-                entry += f"\n\nVULNERABLE CODE:\n{code_snippet}"
+                block, covered = _cap_snippet(code_snippet, vuln.lines.count('\n'))
+                parts.append(f"VULNERABLE CODE:\n{block}")
         
         # Include extra metadata if available
-        if 'extra' in vuln:
-            extra = vuln['extra']
-            if 'lines' in extra:
-                entry += f"\n\nFULL CODE BLOCK:\n{extra['lines']}"
-            if 'metadata' in extra:
-                metadata = extra['metadata']
-                if 'cwe' in metadata:
-                    entry += f"\nCWE: {metadata['cwe']}"
-                if 'owasp' in metadata:
-                    entry += f"\nOWASP: {metadata['owasp']}"
+        if vuln.lines and not covered:
+            parts.append(f"FULL CODE BLOCK:\n{_cap_block(vuln.lines)}")
+        if vuln.cwe:
+            parts.append(f"CWE: {', '.join(vuln.cwe)}")
+        if vuln.owasp:
+            parts.append(f"OWASP: {', '.join(vuln.owasp)}")
         
-        formatted.append(entry)
+        formatted.append("\n".join(parts))
     
-    return "\n".join(formatted)
+    return formatted
+
+
+def _relative_to_project(vulns: List[Vuln], project_path: str) -> List[Vuln]:
+    """
+    Findings with paths made relative to the project root. Scanners report
+    paths as they were passed in (already under project_path); anything
+    else is taken as relative to the root already. Paths outside the root
+    are left as they are
+    """
+    root = os.path.abspath(project_path)
+    relative = []
+    for vuln in vulns:
+        if vuln.path:
+            abs_path = os.path.abspath(vuln.path)
+            if abs_path.startswith(root + os.sep):
+                vuln = msgspec.structs.replace(vuln, path=os.path.relpath(abs_path, root))
+        relative.append(vuln)
+    return relative
+
+def _cap_block(text: str) -> str:
+    """Trim a code block to MAX_BLOCK_LINES / MAX_BLOCK_CHARS, keeping line breaks"""
+    lines = text.splitlines()
+    capped = "\n".join(lines[:MAX_BLOCK_LINES])
+    if len(capped) > MAX_BLOCK_CHARS:
+        capped = capped[:MAX_BLOCK_CHARS - 3] + "..."
+    elif len(lines) > MAX_BLOCK_LINES:
+        capped += "\n..."
+    return capped
+
+def _cap_snippet(snippet: str, span: int) -> Tuple[str, bool]:
+    """
+    Trim a snippet to MAX_BLOCK_LINES / MAX_BLOCK_CHARS by dropping whole
+    context lines around its >>> line, which is never cut. The finding's
+    own `span` lines after it are kept first, then context alternately
+    before and after. Returns the block and whether it still shows every
+    line of the finding
+    """
+    lines = snippet.splitlines()
+    marker = next((i for i, line in enumerate(lines) if line.startswith('>>> ')), None)
+    if marker is None:
+        # read error, or the finding's line is past the end of the file
+        return _cap_block(snippet), False
+
+    first = last = marker
+    size = len(lines[marker])
 
+    def fits(i: int) -> bool:
+        return last - first + 1 < MAX_BLOCK_LINES and size + 1 + len(lines[i]) <= MAX_BLOCK_CHARS
 
-def extract_code_snippet(file_path: str, line_num: int, context_lines: int = 3) -> str:
+    while last < min(marker + span, len(lines) - 1) and fits(last + 1):
+        last += 1
+        size += 1 + len(lines[last])
+    covered = last >= marker + span
+
+    grow_before = grow_after = True
+    while grow_before or grow_after:
+        grow_before = grow_before and first > 0 and fits(first - 1)
+        if grow_before:
+            first -= 1
+            size += 1 + len(lines[first])
+        grow_after = grow_after and last < len(lines) - 1 and fits(last + 1)
+        if grow_after:
+            last += 1
+            size += 1 + len(lines[last])
+
+    block = "\n".join(lines[first:last + 1])
+    if first > 0:
+        block = "...\n" + block
+    if last < len(lines) - 1:
+        block += "\n..."
+    return block, covered
+
+
+
+class _FileIndex:
+    """
+    Memory-mapped file plus the byte offset where each line starts, so
+    every snippet in the file is one slice + decode of the mapping
+    """
+    def __init__(self, abs_path: str, stop: int):
+        with open(abs_path, 'rb') as f:
+            # mmap refuses empty files
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b''
+
+        # starts[i] is where line i begins (0-based), the last entry is
+        # the end of the last indexed line; stop indexing past `stop` lines
+        starts = [0]
+        size = len(self._mm)
+        while len(starts) <= stop:
+            pos = self._mm.find(b'\n', starts[-1]) + 1
+            if not pos:
+                if starts[-1] < size:
+                    starts.append(size)
+                break
+            starts.append(pos)
+        self.starts = starts
+
+    @property
+    def line_count(self) -> int:
+        return len(self.starts) - 1
+
+    def lines(self, first: int, last: int) -> List[str]:
+        """Lines [first, last), 0-based, newline characters removed"""
+        text = self._mm[self.starts[first]:self.starts[last]].decode('utf-8')
+        return text.split('\n')[:last - first]
+
+@functools.lru_cache(maxsize=256)
+def _file_index(abs_path: str, stop: int) -> _FileIndex:
+    """Memoized so findings in the same file share one index"""
+    return _FileIndex(abs_path, stop)
+
+def extract_code_snippet(file_path: str, line_num: int, context_lines: int = 3, read_upto: int = 0) -> str:
+    """read_upto: index at least this many lines so callers can share one cached index per file"""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
+        end = line_num + context_lines
+        index = _file_index(file_path, max(end, read_upto))
         
         start = max(0, line_num - context_lines - 1)
-        end = min(len(lines), line_num + context_lines)
+        end = min(index.line_count, end)
+        if start >= end:
+            return ""
         
         snippet = []
-        for i in range(start, end):
+        for i, line in enumerate(index.lines(start, end), start):
             line_marker = ">>> " if i == line_num - 1 else "    "
-            snippet.append(f"{line_marker}{i+1:4d} | {lines[i].rstrip()}")
+            snippet.append(f"{line_marker}{i+1:4d} | {line.rstrip()}")
         
         return "\n".join(snippet)
     except Exception as e:
         return f"(Could not read code: {e})"
 
 
-def format_sca_findings(vulnerabilities: List[Dict]) -> str:
-    if not vulnerabilities:
-        return "No SCA issues found."
-    
+def format_sca_findings(vulnerabilities: List[ScaVuln]) -> str:
+    return _SEP.join(sca_finding_entries(vulnerabilities)) or "No SCA issues found."
+
+def sca_finding_entries(vulnerabilities: List[ScaVuln]) -> List[str]:
+    """One numbered prompt entry per SCA finding"""
     formatted = []
     for idx, vuln in enumerate(vulnerabilities, 1):
-        entry = f"\n{'='*50}\nDEPENDENCY #{idx}: {vuln.get('title', 'Unknown vulnerability')}"
-        entry += f"\nSeverity: {vuln.get('severity', 'N/A')}"
-        
-        package = vuln.get('package', vuln.get('packageName', 'N/A'))
-        version = vuln.get('version', 'N/A')
-        entry += f"\nPackage: {package} @ {version}"
+        package = vuln.package_name or 'N/A'
+        version = vuln.version or 'N/A'
+        parts = [
+            f"DEPENDENCY #{idx}: {vuln.title or 'Unknown vulnerability'}",
+            f"Severity: {vuln.severity or 'N/A'}",
+            f"Package: {package} @ {version}"
+            + (f" ({vuln.package_manager})" if vuln.package_manager else "")
+        ]
         
         # Upgrade path
-        fixed_in = vuln.get('fixed_in', vuln.get('fixedIn'))
-        if fixed_in:
-            entry += f"\n✅ FIX AVAILABLE: Upgrade to {fixed_in}"
-            entry += f"\n   Command: pip install {package}=={fixed_in}"
+        if vuln.fixed_in:
+            fixed_in = vuln.fixed_in[0]
+            command = UPGRADE_COMMANDS.get(vuln.package_manager)
+            if command:
+                # the go template adds the 'v' prefix itself
+                target = fixed_in.lstrip('v') if vuln.package_manager == 'gomodules' else fixed_in
+                command = command.format(package=package, version=target)
+                parts.append(f"Fix: upgrade to {fixed_in} ({command})")
+            else:
+                parts.append(f"Fix: upgrade to {fixed_in}")
         else:
-            entry += f"\n⚠️  NO FIX AVAILABLE - Consider replacing this library"
+            parts.append("No fix available - consider replacing this library")
         
         # CVE info
-        if 'identifiers' in vuln:
-            identifiers = vuln['identifiers']
-            cves = []
-            
-            if isinstance(identifiers, list) and identifiers:
-                if isinstance(identifiers[0], dict):
-                    cves = [i.get('value') for i in identifiers if i.get('type') == 'CVE']
-                elif isinstance(identifiers[0], str):
-                    cves = [i for i in identifiers if 'CVE' in i]
-            
-            if cves:
-                entry += f"\nCVE: {', '.join(cves)}"
+        cves = vuln.identifiers.get('CVE', ())
+        if cves:
+            parts.append(f"CVE: {', '.join(cves)}")
         
-        formatted.append(entry)
+        formatted.append("\n".join(parts))
     
-    return "\n".join(formatted)
\ No newline at end of file
+    return formatted
@@ -1,93 +1,45 @@
 from typing_extensions import Literal
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 
 # ======================= Pydantic Schemas =======================
+# Field guidance lives in the prompt (llm_analyzer.OUTPUT_GUIDANCE), not in
+# descriptions/examples, which would be resent in the tool schema every call
 
 class CodeLocation(BaseModel):
-    file_path: str = Field(
-        description="Relative or absolute path to the vulnerable file"
-    )
-    start_line: int = Field(
-        description="Line number where the vulnerability starts (use 0 if unknown)"
-    )
-    end_line: Optional[int] = Field(
-        default=None,
-        description="Line number where the vulnerability ends (optional)"
-    )
+    file_path: str
+    start_line: int
+    end_line: Optional[int] = None
 
 class FixSuggestion(BaseModel):
-    description: str = Field(
-        description="Detailed explanation of how to fix the issue, including specific code changes or commands",
-        examples=[
-            "Replace string formatting with parameterized queries using SQLAlchemy text() with bound parameters",
-            "Run: pip install requests==2.31.0 to upgrade to patched version",
-            "Use Jinja2 auto-escaping: {{ user_input | e }} instead of raw HTML concatenation"
-        ]
-    )
-    patch: Optional[str] = Field(
-        default=None,
-        description="""Unified diff format patch (optional, for code fixes only). Format:
---- a/path/to/file.py
-+++ b/path/to/file.py
-@@ -line,count +line,count @@
--removed line
-+added line
-
-Leave as null for dependency issues or when concrete patch cannot be generated.""",
-        examples=[
-            "--- a/app.py\n+++ b/app.py\n@@ -10,2 +10,3 @@\n-query = f\"SELECT * FROM users WHERE id={uid}\"\n+query = \"SELECT * FROM users WHERE id=?\"\n+cursor.execute(query, [uid])"
-        ]
-    )
+    description: str
+    patch: Optional[str] = None
 
 class SecurityIssue(BaseModel):
-    tool: str = Field(
-        description="Source scanning tool that detected this issue",
-        examples=["Semgrep", "Snyk", "Manual Review"]
-    )
-    risk_level: Literal["Critical", "High", "Medium", "Low"] = Field(
-        description="Severity level based on exploitability and impact"
-    )
-    message: str = Field(
-        description="Clear, concise description of the vulnerability",
-        examples=[
-            "SQL injection via string formatting in user authentication",
-            "XSS vulnerability in comment rendering without escaping",
-            "Outdated dependency with known RCE vulnerability"
-        ]
-    )
-    location: Optional[CodeLocation] = Field(
-        default=None,
-        description="Code location (required for SAST issues, null for SCA dependency issues)"
-    )
-    fix: Optional[FixSuggestion] = Field(
-        default=None,
-        description="Actionable fix with description and optional patch"
-    )
+    tool: str
+    risk_level: Literal["Critical", "High", "Medium", "Low"]
+    message: str
+    location: Optional[CodeLocation] = None
+    fix: Optional[FixSuggestion] = None
 
 class LLMAnalysisResult(BaseModel):
-    issues: List[SecurityIssue] = Field(
-        description="Unified, deduplicated list of security issues with actionable fixes"
-    )
-    overall_risk: Literal["Critical", "High", "Medium", "Low"] = Field(
-        description="Overall project security risk (use highest severity found)"
-    )
-    remediation_priority: List[str] = Field(
-        description="""Prioritized list of 3-5 specific remediation actions. 
-Each action should be concrete and actionable, e.g.:
-- 'Fix SQL injection in auth.py line 45 by using parameterized queries'
-- 'Upgrade requests from 2.25.0 to 2.31.0 (pip install requests==2.31.0)'
-- 'Replace pickle deserialization with JSON in data_handler.py'""",
-        min_length=3,
-        max_length=5,
-        examples=[
-            [
-                "Immediately fix Critical SQL injection in app.py:45 using bound parameters",
-                "Upgrade Django from 3.1.0 to 3.2.20 to patch CVE-2023-12345",
-                "Replace insecure pickle usage with JSON serialization in cache.py",
-                "Add input validation and escaping for all user-facing forms",
-                "Enable SAST/SCA in CI/CD pipeline to prevent regression"
-            ]
-        ]
-    )
\ No newline at end of file
+    issues: List[SecurityIssue]
+    overall_risk: Literal["Critical", "High", "Medium", "Low"]
+    remediation_priority: List[str] = Field(min_length=3, max_length=5)
+
+    @classmethod
+    def from_cached(cls, data: Dict[str, Any]) -> "LLMAnalysisResult":
+        """
+        Rebuild from a cached model_dump without re-validating; the dump
+        was validated when the LLM response was parsed
+        """
+        issues = []
+        for issue in data['issues']:
+            location, fix = issue.get('location'), issue.get('fix')
+            issues.append(SecurityIssue.model_construct(**{
+                **issue,
+                'location': CodeLocation.model_construct(**location) if location else None,
+                'fix': FixSuggestion.model_construct(**fix) if fix else None,
+            }))
+        return cls.model_construct(**{**data, 'issues': issues})
@@ -1,13 +1,13 @@
 from typing import Annotated, TypedDict, List, Dict, Any
 import operator
+from tools.results import SastResults, ScaResults
 
 class ScanState(TypedDict):
     project_path: str
-    all_files: List[str]
     total_files: int
 
-    sast_results: Dict[str, Any]
-    sca_results: Dict[str, Any]
+    sast_results: SastResults
+    sca_results: ScaResults
     
     # Final ouput
     final_report: Dict[str, Any]
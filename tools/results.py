@@ -0,0 +1,69 @@
+from typing import Dict, List, Optional, Tuple, Union
+
+import msgspec
+
+
+# ======================= Scanner result structs =======================
+# Findings hold only strings/ints/lists of strings and can never form a
+# reference cycle, so gc=False keeps thousands of them out of the cyclic
+# GC's tracked set (no GC passes triggered while decoding large scans)
+
+class Vuln(msgspec.Struct, gc=False):
+    """
+    One Semgrep finding, flattened from its `results[]` entry; of the rule
+    metadata only the CWE/OWASP tags are kept
+    """
+    check_id: str
+    severity: str = ''
+    message: str = ''
+    path: Optional[str] = None
+    line: Optional[int] = None
+    lines: str = ''
+    cwe: List[str] = []
+    owasp: List[str] = []
+
+class SastResults(msgspec.Struct):
+    tool: str = 'semgrep'
+    total_files: int = 0
+    vulnerabilities: List[Vuln] = []
+    total_issues: int = 0
+    error: Optional[str] = None
+    # files Semgrep reported errors for (Timeout, PartialParsing, ...),
+    # whose findings may be incomplete
+    error_paths: List[str] = []
+
+
+class ScaVuln(msgspec.Struct, rename="camel", gc=False):
+    """One Snyk dependency vulnerability, decoded directly from `vulnerabilities[]`"""
+    title: str = ''
+    severity: str = ''
+    package_name: str = ''
+    version: str = ''
+    fixed_in: List[str] = []
+    identifiers: Dict[str, List[str]] = {}
+    # Snyk's name for the ecosystem ('pip', 'npm', 'maven', ...)
+    package_manager: str = ''
+
+class ScaResults(msgspec.Struct):
+    tool: str = 'snyk'
+    vulnerabilities: List[ScaVuln] = []
+    total_issues: int = 0
+    error: Optional[str] = None
+
+
+# Scanner severities, most severe first (Semgrep's ERROR/WARNING/INFO and
+# the CRITICAL..LOW scale used by newer Semgrep rules and by Snyk)
+SEVERITY_ORDER = {
+    'CRITICAL': 0, 'ERROR': 1, 'HIGH': 1, 'WARNING': 2, 'MEDIUM': 2,
+    'INFO': 3, 'LOW': 3,
+}
+
+def sort_by_severity(vulns: Union[List[Vuln], List[ScaVuln]]) -> None:
+    """Most severe first, then by location or package, so truncated slices keep the worst issues"""
+    vulns.sort(key=_severity_key)
+
+def _severity_key(v: Union[Vuln, ScaVuln]) -> Tuple:
+    rank = SEVERITY_ORDER.get(v.severity.upper(), 4)
+    if isinstance(v, ScaVuln):
+        return (rank, v.package_name, v.version, v.title)
+    return (rank, v.path or '', v.line or 0)
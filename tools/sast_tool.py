@@ -1,83 +1,256 @@
+import os
+import stat
+import time
+import hashlib
+import logging
 import subprocess 
-import json
-from typing import Dict, List, Any
+import asyncio
+import functools
+import urllib.request
+from pathlib import Path
+from typing import Any, List, Optional
+
+import msgspec
+
+from .results import SastResults, Vuln, sort_by_severity
+
+logger = logging.getLogger(__name__)
+
+MIN_FILES_PER_SHARD = 50
+# No telemetry or update check per run; keep rule ids as written in the
+# bundle instead of prefixing them with the cached file's path
+SEMGREP_FLAGS = ('--disable-version-check', '--no-rewrite-rule-ids')
+
+
+# ======================= Semgrep --json wire format =======================
+# Only the fields we consume are declared, msgspec skips the rest
+# (paths.scanned, errors, fingerprints, ...) without building objects;
+# per-result structs are acyclic, so they skip GC tracking (gc=False)
+
+class _SemgrepPosition(msgspec.Struct, gc=False):
+    line: int
+
+class _SemgrepMetadata(msgspec.Struct, gc=False):
+    # rule metadata also carries references, sources, technology, ... which
+    # are never consumed; cwe/owasp are a string or a list in most rules but
+    # third-party rules also use null or objects, so they're decoded loosely
+    # (one odd rule must not fail the whole shard) and normalised by _as_list
+    cwe: Any = []
+    owasp: Any = []
+
+class _SemgrepExtra(msgspec.Struct, gc=False):
+    message: str = ''
+    severity: str = ''
+    lines: str = ''
+    metadata: _SemgrepMetadata = msgspec.field(default_factory=_SemgrepMetadata)
+
+class _SemgrepResult(msgspec.Struct, gc=False):
+    check_id: str
+    path: str
+    start: Optional[_SemgrepPosition] = None
+    extra: _SemgrepExtra = msgspec.field(default_factory=_SemgrepExtra)
+
+class _SemgrepError(msgspec.Struct, gc=False):
+    # per-file problems (Timeout, PartialParsing, ...) carry the file's
+    # path, rule and config errors don't
+    path: Optional[str] = None
+
+class _SemgrepOutput(msgspec.Struct):
+    results: List[_SemgrepResult] = []
+    errors: List[_SemgrepError] = []
+
+_SEMGREP_DECODER = msgspec.json.Decoder(_SemgrepOutput)
+
+def _as_list(value: Any) -> List[str]:
+    """Rule metadata tag(s) as a list of strings, dropping nulls"""
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        value = [value]
+    return [v if isinstance(v, str) else str(v) for v in value if v is not None]
+
+RULES_CACHE_DIR = Path(os.getenv(
+    "SEMGREP_RULES_CACHE_DIR", Path.home() / ".cache" / "security-mas" / "semgrep"
+))
+RULES_MAX_AGE_SECONDS = 24 * 3600
+REGISTRY_URL = "https://semgrep.dev/c/"
+# 'auto' is resolved server-side from project metadata and can't be
+# downloaded as a file; p/default is the registry's general-purpose pack
+AUTO_PACK = "p/default"
+
+
+@functools.lru_cache(maxsize=1)
+def semgrep_version() -> str:
+    """Installed Semgrep version, '' when it cannot be determined"""
+    try:
+        result = subprocess.run(
+            ['semgrep', '--version'],
+            capture_output=True,
+            timeout=30
+        )
+        return result.stdout.decode('utf-8', 'replace').strip() if result.returncode == 0 else ''
+    except Exception:
+        return ''
+
+def resolve_rules(rules_config: str) -> str:
+    """
+    Map a registry config ('auto', 'p/...', 'r/...') to a local copy of the
+    rules, re-downloaded when older than 24h. Local paths are returned
+    unchanged; if nothing can be synced the original config is kept.
+    """
+    pack = AUTO_PACK if rules_config == "auto" else rules_config
+    if not pack.startswith(('p/', 'r/')) or os.path.exists(pack):
+        return rules_config
+
+    rules_path = RULES_CACHE_DIR / (pack.replace('/', '_') + '.yaml')
+    try:
+        if time.time() - rules_path.stat().st_mtime < RULES_MAX_AGE_SECONDS:
+            return str(rules_path)
+    except OSError:
+        pass
+
+    try:
+        logger.info("Syncing Semgrep rules %s -> %s", pack, rules_path)
+        with urllib.request.urlopen(REGISTRY_URL + pack, timeout=30) as resp:
+            rules = resp.read()
+        RULES_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = rules_path.with_suffix(f'.{os.getpid()}.tmp')
+        tmp_path.write_bytes(rules)
+        os.replace(tmp_path, rules_path)
+    except Exception as e:
+        logger.warning("Semgrep rules sync failed: %s", e)
+
+    # a stale copy still beats a registry round-trip on every scan
+    return str(rules_path) if rules_path.exists() else rules_config
+
+
+def rules_fingerprint(rules_config: str) -> str:
+    """
+    rules_config plus a hash of the rules file content, so a refresh that
+    changes the rules invalidates cached results and one that doesn't
+    keeps them. Configs that aren't a local file are used as they are
+    """
+    try:
+        st = os.stat(rules_config)
+    except OSError:
+        return rules_config
+    if not stat.S_ISREG(st.st_mode):
+        return f"{rules_config}@{int(st.st_mtime)}"
+    return f"{rules_config}@{_rules_digest(rules_config, st.st_mtime_ns, st.st_size)}"
+
+@functools.lru_cache(maxsize=8)
+def _rules_digest(path: str, mtime_ns: int, size: int) -> str:
+    """Content hash of a rules file, recomputed only when the file is rewritten"""
+    with open(path, 'rb') as f:
+        return hashlib.file_digest(f, 'sha256').hexdigest()
+
 
 class SemgrepScanner:
-    def __init__(self, rules_config: str="auto"):
+    def __init__(self, rules_config: str="auto", jobs: Optional[int]=None):
         """
         Args:
-            rules_config: 'auto' or custom rules path
+            rules_config: 'auto', registry pack ('p/python') or custom rules path;
+                registry configs are served from the local rules cache
+            jobs: semgrep --jobs budget shared by all shards (default: cpu count)
         """
-        self.rules_config = rules_config
+        self.rules_config = resolve_rules(rules_config)
+        self.rules_fingerprint = rules_fingerprint(self.rules_config)
+        self.jobs = jobs or os.cpu_count() or 4
 
-    def scan_files(self, file_paths: List[str]) -> Dict[str, Any]:
+    async def scan_files(self, file_paths: List[str]) -> SastResults:
         """
         Returns:
-            {
-                'tool': 'semgrep',
-                'total_files': int,
-                'vulnerabilities': [...]
-                'total_issues': int,
-                'error': None or Error message
-            }
+            SastResults(tool='semgrep', total_files, vulnerabilities: List[Vuln],
+                        total_issues, error=None or Error message)
         """
         if not file_paths:
-            return {
-                'tool': 'semgrep',
-                'total_files': 0,
-                'vulnerabilities': [],
-                'total_issues': 0,
-                'error': None
-            }
-        
+            return SastResults()
+
+        # Each semgrep process pays the rule-compile cost once, so avoid
+        # over-sharding small projects
+        num_shards = min(self.jobs, max(1, len(file_paths) // MIN_FILES_PER_SHARD))
+        shards = [file_paths[i::num_shards] for i in range(num_shards)]
+        # split the job budget so shards don't oversubscribe the cores
+        jobs_per_shard = max(1, self.jobs // num_shards)
+        logger.info("Semgrep is scanning %d files in %d shard(s)", len(file_paths), num_shards)
+
+        results = await asyncio.gather(*(self._scan_shard(shard, jobs_per_shard) for shard in shards))
+        vulnerabilities = [v for r in results for v in r.vulnerabilities]
+        sort_by_severity(vulnerabilities)
+        errors = [r.error for r in results if r.error]
+        error_paths = [p for r in results for p in r.error_paths]
+        logger.info("Semgrep found %d issues", len(vulnerabilities))
+        if error_paths:
+            logger.warning("Semgrep reported errors for %d file(s)", len(error_paths))
+        return SastResults(
+            total_files=len(file_paths),
+            vulnerabilities=vulnerabilities,
+            total_issues=len(vulnerabilities),
+            error="\n".join(errors) if errors else None,
+            error_paths=error_paths
+        )
+
+    async def _scan_shard(self, file_paths: List[str], jobs: int) -> SastResults:
+        """Run one semgrep process over a shard of the file list"""
         try:
-            print(f"Semgrep is scanning {len(file_paths)} files...")
             cmd = [
                 'semgrep',
                 '--config', self.rules_config,
+                '--jobs', str(jobs),
                 '--json',
-                '--quiet'
-            ] + file_paths
-
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=60
+                '--quiet',
+                *SEMGREP_FLAGS
+            ]
+            # semgrep refuses --config auto with metrics off, which only
+            # happens when no local rules copy could be synced
+            if self.rules_config != 'auto':
+                cmd.append('--metrics=off')
+            cmd += file_paths
+
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
             )
+            try:
+                stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=60)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+                raise
 
-            if result.returncode==0 or result.returncode==1:
-                output = json.loads(result.stdout)
-                vulnerabilities = output.get('results', [])
-                print(f"Semgrep found {len(vulnerabilities)} issues")
-                return {
-                    'tool': 'semgrep',
-                    'total_files': len(file_paths),
-                    'vulnerabilities': vulnerabilities,
-                    'total_issues': len(vulnerabilities),
-                    'error': None
-                }
+            if proc.returncode==0 or proc.returncode==1:
+                output = _SEMGREP_DECODER.decode(stdout)
+                # drop the raw JSON (can be tens of MB) before building Vulns
+                del stdout
+                vulnerabilities = [
+                    Vuln(
+                        check_id=r.check_id,
+                        severity=r.extra.severity,
+                        message=r.extra.message,
+                        path=r.path,
+                        line=r.start.line if r.start else None,
+                        lines=r.extra.lines,
+                        cwe=_as_list(r.extra.metadata.cwe),
+                        owasp=_as_list(r.extra.metadata.owasp)
+                    )
+                    for r in output.results
+                ]
+                return SastResults(
+                    total_files=len(file_paths),
+                    vulnerabilities=vulnerabilities,
+                    total_issues=len(vulnerabilities),
+                    error_paths=sorted({e.path for e in output.errors if e.path})
+                )
             else:
-                return {
-                    'tool': 'semgrep',
-                    'total_files': len(file_paths),
-                    'vulnerabilities': [],
-                    'total_issues': 0,
-                    'error': result.stderr
-                }
-        except subprocess.TimeoutExpired:
-            return {
-                'tool': 'semgrep',
-                'total_files': len(file_paths),
-                'vulnerability': [],
-                'total_issues': 0,
-                'error': 'Timeout after 60s'
-            }
+                return SastResults(
+                    total_files=len(file_paths),
+                    error=(
+                        stderr.decode('utf-8', 'replace') if stderr
+                        else f'semgrep exited with code {proc.returncode}'
+                    )
+                )
+        except asyncio.TimeoutError:
+            return SastResults(total_files=len(file_paths), error='Timeout after 60s')
         except Exception as e:
-            return {
-                'tool': 'semgrep',
-                'total_files': len(file_paths),
-                'vulnerability': [],
-                'total_issues': 0,
-                'error': str(e)
-            }
+            return SastResults(total_files=len(file_paths), error=str(e))
@@ -1,95 +1,160 @@
-import subprocess
-import json
+import asyncio
+import logging
 import os
-from typing import Dict, Any
+from typing import Dict, List, Tuple
+
+import msgspec
+
+from .results import ScaResults, ScaVuln, sort_by_severity
+
+
+logger = logging.getLogger(__name__)
+
+# Dependency manifests Snyk can test directly with --file, mapped to the
+# package manager Snyk reports for them
+PACKAGE_MANAGERS = {
+    'requirements.txt': 'pip', 'Pipfile': 'pipenv', 'poetry.lock': 'poetry',
+    'package-lock.json': 'npm', 'yarn.lock': 'yarn', 'pnpm-lock.yaml': 'pnpm',
+    'pom.xml': 'maven', 'build.gradle': 'gradle', 'go.mod': 'gomodules',
+    'Gemfile.lock': 'rubygems', 'composer.lock': 'composer',
+}
+MANIFESTS = frozenset(PACKAGE_MANAGERS)
+
+# Manifests describing the same dependencies, most precise first; only the
+# first one present in a directory is tested so findings aren't reported twice
+ECOSYSTEMS = (
+    ('poetry.lock', 'Pipfile', 'requirements.txt'),
+    ('package-lock.json', 'pnpm-lock.yaml', 'yarn.lock'),
+    ('pom.xml', 'build.gradle'),
+    ('go.mod',), ('Gemfile.lock',), ('composer.lock',),
+)
+_MANIFEST_RANK = {
+    name: (group, rank)
+    for group, names in enumerate(ECOSYSTEMS)
+    for rank, name in enumerate(names)
+}
+
+# ScaResults.error for a project without manifests, which is not a failure
+NO_MANIFESTS_ERROR = 'No dependency manifests found'
+
+# snyk processes running at once
+SNYK_CONCURRENCY = os.cpu_count() or 4
+
+
+# Snyk --json wire format, only `vulnerabilities` and `packageManager` are consumed
+class _SnykOutput(msgspec.Struct, rename="camel"):
+    vulnerabilities: List[ScaVuln] = []
+    package_manager: str = ''
+
+_SNYK_DECODER = msgspec.json.Decoder(_SnykOutput)
+
+
+def select_manifests(manifests: List[str]) -> List[str]:
+    """Keep the preferred manifest of each ecosystem per directory (see ECOSYSTEMS), in input order"""
+    chosen: Dict[Tuple[str, object], Tuple[int, str]] = {}
+    for manifest in manifests:
+        name = os.path.basename(manifest)
+        # anything outside ECOSYSTEMS is its own group
+        group, rank = _MANIFEST_RANK.get(name, (name, 0))
+        key = (os.path.dirname(manifest), group)
+        if key not in chosen or rank < chosen[key][0]:
+            chosen[key] = (rank, manifest)
+    keep = {manifest for _, manifest in chosen.values()}
+    return [m for m in manifests if m in keep]
+
 
 class SnykScanner:
-    def scan_dependencies(self, project_path: str):
+    async def scan_dependencies(self, project_path: str, manifests: List[str]) -> ScaResults:
         """
+        Args:
+            project_path: project root, used as snyk's working directory
+            manifests: dependency manifests to test (see MANIFESTS)
         Returns:
-            {
-                'tool': 'snyk',
-                'vulnerabilities': [...],
-                'total_issues': int,
-                'error': None or Error message
-            }
+            ScaResults(tool='snyk', vulnerabilities: List[ScaVuln],
+                       total_issues, error=None or Error message)
         """
+        project_path = os.path.abspath(project_path)
+
+        logger.info("Snyk is scanning dependencies in %s", project_path)
+
+        if not manifests:
+            return ScaResults(error=NO_MANIFESTS_ERROR)
+        manifests = select_manifests(manifests)
+        logger.info("Found %d manifest(s): %s", len(manifests), ", ".join(manifests))
+
+        limit = asyncio.Semaphore(SNYK_CONCURRENCY)
+
+        async def _bounded(manifest: str) -> ScaResults:
+            async with limit:
+                return await self._scan_manifest(project_path, manifest)
+
+        results = await asyncio.gather(*(_bounded(m) for m in manifests))
+        vulnerabilities = [v for r in results for v in r.vulnerabilities]
+        sort_by_severity(vulnerabilities)
+        errors = [r.error for r in results if r.error]
+        logger.info("Snyk found %d issues", len(vulnerabilities))
+        return ScaResults(
+            vulnerabilities=vulnerabilities,
+            total_issues=len(vulnerabilities),
+            error="\n".join(errors) if errors else None
+        )
+
+    async def _scan_manifest(self, project_path: str, manifest: str) -> ScaResults:
+        """Run `snyk test` against a single manifest file"""
         try:
-            project_path = os.path.abspath(project_path)
-
-            print("Snyk is scanning dependencies...")
-            print(f"Project path: {project_path}")
-
-            req_file = os.path.join(project_path, 'requirements.txt')
-            if not os.path.exists(req_file):
-                print(f"requirements.txt not found at: {req_file}")
-                for root, dirs, files in os.walk(project_path):
-                    if 'requirements.txt' in files:
-                        req_file = os.path.join(root, 'requirements.txt')
-                        print(f"Found requirements.txt at: {req_file}")
-                        break
-                else:
-                    return {
-                        'tool': 'snyk',
-                        'vulnerabilities': [],
-                        'total_issues': 0,
-                        'error': 'No requirements.txt found'
-                    }
-            
             cmd = [
                 'snyk', 'test',
-                f'--file={req_file}',
-                '--json',
-                '--package-manager=pip'
+                f'--file={os.path.abspath(manifest)}',
+                '--json'
             ]
+            if os.path.basename(manifest) == 'requirements.txt':
+                cmd.append('--package-manager=pip')
 
             # Run
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=60,
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
                 cwd=project_path
             )
+            try:
+                stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=60)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+                raise
 
             # Parse output
-            if result.stdout:
+            if stdout:
                 try:
-                    output = json.loads(result.stdout)
-                    vulnerabilities = output.get('vulnerabilities', [])
-                    print(f"Snyk found {len(vulnerabilities)} issues")
-                    
-                    return {
-                        'tool': 'snyk',
-                        'vulnerabilities': vulnerabilities,
-                        'total_issues': len(vulnerabilities),
-                        'error': None
-                    }
-                except json.JSONDecodeError:
-                    return {
-                        'tool': 'snyk',
-                        'vulnerabilities': [],
-                        'total_issues': 0,
-                        'error': f'Cannot parse Snyk output: {result.stdout[:200]}'
-                    }
+                    output = _SNYK_DECODER.decode(stdout)
+                except msgspec.DecodeError:
+                    return ScaResults(
+                        error=f'Cannot parse Snyk output for {manifest}: {stdout[:200].decode("utf-8", "replace")}'
+                    )
+                # tag every finding with its ecosystem so the prompt can
+                # render the matching upgrade command
+                package_manager = (
+                    output.package_manager
+                    or PACKAGE_MANAGERS.get(os.path.basename(manifest), '')
+                )
+                vulnerabilities = [
+                    v if v.package_manager
+                    else msgspec.structs.replace(v, package_manager=package_manager)
+                    for v in output.vulnerabilities
+                ]
+                return ScaResults(
+                    vulnerabilities=vulnerabilities,
+                    total_issues=len(vulnerabilities)
+                )
             else:
-                return {
-                    'tool': 'snyk',
-                    'vulnerabilities': [],
-                    'total_issues': 0,
-                    'error': result.stderr or 'No output from Snyk'
-                }
-        except subprocess.TimeoutExpired:
-            return {
-                'tool': 'snyk',
-                'vulnerabilities': [],
-                'total_issues': 0,
-                'error': 'Timeout after 60s'
-            }
+                return ScaResults(
+                    error=(
+                        stderr.decode('utf-8', 'replace') if stderr
+                        else f'No output from Snyk for {manifest}'
+                    )
+                )
+        except asyncio.TimeoutError:
+            return ScaResults(error=f'Timeout after 60s ({manifest})')
         except Exception as e:
-            return {
-                'tool': 'snyk',
-                'vulnerabilities': [],
-                'total_issues': 0,
-                'error': str(e)
-            }
+            return ScaResults(error=str(e))